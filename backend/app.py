@@ -1,10 +1,17 @@
 import os
+import re
+import time
+import secrets
+import hashlib
 import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory
-from base64 import b64encode, b64decode
-from Crypto.Protocol.KDF import PBKDF2
-from Crypto.Hash import SHA256
+from werkzeug.security import safe_join
+from pybase64 import b64encode, b64decode
 from encryption_algorithms import (
     aes_encrypt,
     aes_decrypt,
@@ -30,6 +37,18 @@ logging.basicConfig(
 app = Flask(__name__)
 CORS(app)
 
+# ─── Payload Limits ─────────────────────────────────────────────────────────────
+# MAX_PAYLOAD_BYTES caps the decoded image sent to /encrypt (default 32 MB).
+# /decrypt accepts that plus the largest cipher overhead (salt + IV + one pad
+# block), so any blob /encrypt returns can be decrypted again; /encrypt refuses
+# outputs above it, which only LSB (re-encoding e.g. a JPEG as PNG) can produce.
+# The raw request body is capped at the base64 size of the larger limit so
+# oversized uploads are rejected before JSON parsing.
+MAX_PAYLOAD_BYTES = int(os.environ.get('MAX_PAYLOAD_BYTES', 32 * 1024 * 1024))
+CIPHER_OVERHEAD_BYTES = 16 + 16 + 16
+MAX_ENCRYPTED_BYTES = int(os.environ.get('MAX_ENCRYPTED_BYTES', MAX_PAYLOAD_BYTES + CIPHER_OVERHEAD_BYTES))
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_PAYLOAD_BYTES, MAX_ENCRYPTED_BYTES) * 4 // 3 + 64 * 1024
+
 # ─── Storage Folders ────────────────────────────────────────────────────────────
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ENCRYPTED_FOLDER = os.path.join(BASE_DIR, 'encrypted')
@@ -37,7 +56,119 @@ DECRYPTED_FOLDER = os.path.join(BASE_DIR, 'decrypted')
 os.makedirs(ENCRYPTED_FOLDER, exist_ok=True)
 os.makedirs(DECRYPTED_FOLDER, exist_ok=True)
 
+# ─── Background Blob Writes ─────────────────────────────────────────────────────
+# Saving to disk happens off the request thread. Each blob is written to a temp
+# file in the target folder and os.replace()d into place, so a file that exists
+# is always complete. Download routes may run in another gunicorn worker than
+# the one writing, so they poll the filesystem briefly for the file to appear,
+# but only for names this app generates; anything else 404s straight away.
+DOWNLOAD_WAIT_SECONDS = 1.0
+_BLOB_NAME_RE = re.compile(r'(?:en|de)crypted_\d{14}_[0-9a-f]{8}\.png')
+_write_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='blob-writer')
+
+def _write_blob(path: str, blob: bytes) -> None:
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+        logging.info("File saved: %s", path)
+    except OSError:
+        logging.exception("Failed to save file: %s", path)
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def blob_filename(kind: str) -> str:
+    """
+    Unique download name for a new blob, e.g. encrypted_20250101120000_1a2b3c4d.png.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    return f"{kind}_{timestamp}_{secrets.token_hex(4)}.png"
+
+def save_blob_async(path: str, blob: bytes) -> None:
+    """
+    Queues blob to be written atomically to path on a background thread.
+    """
+    _write_executor.submit(_write_blob, path, blob)
+
+def wait_for_file(folder: str, filename: str, timeout: float = DOWNLOAD_WAIT_SECONDS) -> None:
+    """
+    Blocks until folder/filename exists or timeout elapses (the caller then
+    serves it or 404s as usual). Returns at once for names blob_filename()
+    could not have produced.
+    """
+    if not _BLOB_NAME_RE.fullmatch(filename):
+        return
+    path = safe_join(folder, filename)
+    if path is None:
+        return
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
 # ─── Helper: Derive AES Key from Passphrase ─────────────────────────────────────
+# Derived keys are cached per (passphrase, salt, key_len) for the life of the
+# process; the derivation is deterministic so entries never go stale.
+KEY_CACHE_SIZE = 128
+_key_cache: "OrderedDict[tuple[str, bytes, int], bytearray]" = OrderedDict()
+_key_cache_lock = threading.Lock()
+
+# Cache misses run the KDF on a small thread pool; hashlib.pbkdf2_hmac releases
+# the GIL, so concurrent cold derivations still spread across cores without the
+# start-up cost and memory of worker processes. The pool is sized so that all
+# gunicorn workers together (WEB_CONCURRENCY) run about one KDF per core;
+# KDF_WORKERS overrides it.
+KDF_WORKERS = int(os.environ.get(
+    'KDF_WORKERS',
+    max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+))
+_kdf_executor = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix='kdf')
+
+def _run_kdf(passphrase_bytes: bytes, salt: bytes, key_len: int) -> bytes:
+    return _kdf_executor.submit(
+        hashlib.pbkdf2_hmac, 'sha256', passphrase_bytes, salt, 100_000, key_len
+    ).result()
+
+def _passphrase_bytes(passphrase: str) -> bytes:
+    """
+    Encodes the passphrase the way PyCryptodome's PBKDF2 did (Latin-1), so
+    keys for existing blobs are unchanged. Raises UnicodeEncodeError for
+    passphrases outside Latin-1; there is deliberately no UTF-8 fallback, as
+    its bytes would collide with other Latin-1 passphrases.
+    """
+    return passphrase.encode('latin-1')
+
+def is_supported_passphrase(passphrase: str) -> bool:
+    try:
+        _passphrase_bytes(passphrase)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def _pbkdf2(passphrase: str, salt: bytes, key_len: int) -> bytes:
+    """
+    Cached PBKDF2-HMAC-SHA256 (100k iterations). Evicted keys are zeroed
+    in place before being dropped.
+    """
+    cache_key = (passphrase, salt, key_len)
+    with _key_cache_lock:
+        cached = _key_cache.get(cache_key)
+        if cached is not None:
+            _key_cache.move_to_end(cache_key)
+            logging.debug("PBKDF2 cache hit")
+            return bytes(cached)
+
+    key = _run_kdf(_passphrase_bytes(passphrase), salt, key_len)
+
+    with _key_cache_lock:
+        _key_cache[cache_key] = bytearray(key)
+        _key_cache.move_to_end(cache_key)
+        while len(_key_cache) > KEY_CACHE_SIZE:
+            _, evicted = _key_cache.popitem(last=False)
+            evicted[:] = bytes(len(evicted))
+    return key
+
 def derive_key_from_passphrase(
     passphrase: str,
     salt: bytes = None,
@@ -52,15 +183,9 @@ def derive_key_from_passphrase(
     """
     if salt is None:
         salt = os.urandom(16)
-        logging.debug(f"Generated new salt: {salt.hex()}")
-    key = PBKDF2(
-        passphrase,
-        salt,
-        dkLen=key_len,
-        count=100_000,
-        hmac_hash_module=SHA256
-    )
-    logging.debug(f"Derived key ({key_len*8}-bit) from passphrase '{passphrase}'")
+        logging.debug("Generated new salt: %s", salt.hex())
+    key = _pbkdf2(passphrase, bytes(salt), key_len)
+    logging.debug("Derived key (%s-bit) from passphrase '%s'", key_len*8, passphrase)
     return salt, key
 
 # ─── (Legacy) Helper: Zero-pad/truncate generic key for other algos ─────────────
@@ -72,13 +197,13 @@ def parse_key(key_str: str, required_len: int) -> bytes:
       - truncating if too long
     Used by Blowfish and Hybrid modes below.
     """
-    logging.debug(f"Parsing key: '{key_str}' to length {required_len}")
+    logging.debug("Parsing key: '%s' to length %s", key_str, required_len)
     key_bytes = key_str.encode('utf-8')
     if len(key_bytes) < required_len:
         key_bytes = key_bytes.ljust(required_len, b'\0')
     else:
         key_bytes = key_bytes[:required_len]
-    logging.debug(f"Parsed key bytes: {key_bytes!r}")
+    logging.debug("Parsed key bytes: %r", key_bytes)
     return key_bytes
 
 # ─── /encrypt Endpoint ──────────────────────────────────────────────────────────
@@ -89,11 +214,12 @@ def encrypt():
         return '', 200
 
     data = request.json or {}
-    logging.info(f"Encryption request received: {list(data.keys())}")
+    logging.info("Encryption request received: %s", list(data.keys()))
 
     image_b64  = data.get('image')
     key_pass   = data.get('key', '')
     algorithm  = data.get('algorithm')
+    inline     = bool(data.get('inline'))
 
     if not image_b64 or not algorithm:
         logging.error("Missing image data or algorithm in request")
@@ -103,17 +229,23 @@ def encrypt():
     if algorithm == 'aes' and not key_pass:
         logging.error("AES encryption requested without a passphrase")
         return jsonify({'error': 'Passphrase is required for AES encryption'}), 400
+    if algorithm == 'aes' and not is_supported_passphrase(key_pass):
+        logging.error("AES encryption requested with a non-Latin-1 passphrase")
+        return jsonify({'error': 'Passphrase must only contain Latin-1 characters'}), 400
 
     try:
         image_bytes = b64decode(image_b64)
-        logging.debug(f"Decoded image bytes length: {len(image_bytes)}")
+        logging.debug("Decoded image bytes length: %s", len(image_bytes))
+        if len(image_bytes) > MAX_PAYLOAD_BYTES:
+            logging.error("Image exceeds payload limit: %s bytes", len(image_bytes))
+            return jsonify({'error': 'Image too large'}), 413
 
         # ─── AES-CBC w/ PBKDF2 Key Derivation ───────────────────────────────
         if algorithm == 'aes':
             salt, key_bytes = derive_key_from_passphrase(key_pass, None, key_len=32)
             aes_payload = aes_encrypt(image_bytes, key_bytes)      # IV||ciphertext
             encrypted = salt + aes_payload
-            logging.debug("Encrypted blob prefix (salt+IV): " + encrypted[:32].hex())
+            logging.debug("Encrypted blob prefix (salt+IV): %s", encrypted[:32].hex())
 
         # ─── Blowfish (legacy) ───────────────────────────────────────────────
         elif algorithm == 'blowfish':
@@ -137,25 +269,29 @@ def encrypt():
             encrypted = hybrid_encrypt(image_bytes, key_bytes, chaos_key)
 
         else:
-            logging.error(f"Invalid encryption algorithm requested: {algorithm}")
+            logging.error("Invalid encryption algorithm requested: %s", algorithm)
             return jsonify({'error': 'Invalid algorithm'}), 400
 
+        if len(encrypted) > MAX_ENCRYPTED_BYTES:
+            logging.error("Encrypted output exceeds decrypt limit: %s bytes", len(encrypted))
+            return jsonify({'error': 'Encrypted image too large'}), 413
+
         # ─── Save encrypted blob ─────────────────────────────────────────────
-        timestamp          = datetime.now().strftime("%Y%m%d%H%M%S")
-        encrypted_filename = f"encrypted_{timestamp}.png"
+        encrypted_filename = blob_filename('encrypted')
         encrypted_path     = os.path.join(ENCRYPTED_FOLDER, encrypted_filename)
-        with open(encrypted_path, 'wb') as f:
-            f.write(encrypted)
-        logging.info(f"Encrypted file saved: {encrypted_path}")
+        save_blob_async(encrypted_path, encrypted)
+        logging.info("Encrypted file queued for saving: %s", encrypted_path)
 
-        encrypted_b64 = b64encode(encrypted).decode('utf-8')
-        logging.info(f"Encryption successful for algorithm: {algorithm}")
+        logging.info("Encryption successful for algorithm: %s", algorithm)
 
-        return jsonify({
-            'encrypted_image':     encrypted_b64,
+        response = {
             'encrypted_file_url':  f"/download/encrypted/{encrypted_filename}",
             'encrypted_filename':  encrypted_filename
-        })
+        }
+        # Inline base64 copy only on request; clients normally fetch the file URL
+        if inline:
+            response['encrypted_image'] = b64encode(encrypted).decode('utf-8')
+        return jsonify(response)
 
     except Exception as e:
         logging.exception("Encryption failed")
@@ -169,11 +305,12 @@ def decrypt():
         return '', 200
 
     data = request.json or {}
-    logging.info(f"Decryption request received: {list(data.keys())}")
+    logging.info("Decryption request received: %s", list(data.keys()))
 
     encrypted_b64 = data.get('encrypted_image')
     key_pass      = data.get('key', '')
     algorithm     = data.get('algorithm')
+    inline        = bool(data.get('inline'))
 
     if not encrypted_b64 or not algorithm:
         logging.error("Missing encrypted image data or algorithm in request")
@@ -183,19 +320,24 @@ def decrypt():
     if algorithm == 'aes' and not key_pass:
         logging.error("AES decryption requested without a passphrase")
         return jsonify({'error': 'Passphrase is required for AES decryption'}), 400
+    if algorithm == 'aes' and not is_supported_passphrase(key_pass):
+        logging.error("AES decryption requested with a non-Latin-1 passphrase")
+        return jsonify({'error': 'Passphrase must only contain Latin-1 characters'}), 400
 
     try:
         encrypted_bytes = b64decode(encrypted_b64)
-        logging.debug(f"Decoded encrypted bytes length: {len(encrypted_bytes)}")
+        logging.debug("Decoded encrypted bytes length: %s", len(encrypted_bytes))
+        if len(encrypted_bytes) > MAX_ENCRYPTED_BYTES:
+            logging.error("Encrypted data exceeds payload limit: %s bytes", len(encrypted_bytes))
+            return jsonify({'error': 'Encrypted data too large'}), 413
 
         # ─── AES-CBC w/ PBKDF2 Key Re-Derivation ────────────────────────────
         if algorithm == 'aes':
-            logging.debug("Received cipher blob prefix: " + encrypted_bytes[:32].hex())
+            logging.debug("Received cipher blob prefix: %s", encrypted_bytes[:32].hex())
             salt     = encrypted_bytes[:16]
-            logging.debug(f"Re-deriving key with salt: {salt.hex()}")
+            logging.debug("Re-deriving key with salt: %s", salt.hex())
             aes_blob, = (encrypted_bytes[16:],)
             _, key_bytes = derive_key_from_passphrase(key_pass, salt, key_len=32)
-            decrypted = aes_decrypt(aes_blob, key_bytes)
             try:
                 decrypted = aes_decrypt(aes_blob, key_bytes)
             except ValueError as e:
@@ -207,7 +349,6 @@ def decrypt():
         # ─── Blowfish (legacy) ───────────────────────────────────────────────
         elif algorithm == 'blowfish':
             key_bytes = parse_key(key_pass, 16)
-            decrypted = blowfish_decrypt(encrypted_bytes, key_bytes)
             try:
                 decrypted = blowfish_decrypt(encrypted_bytes, key_bytes)
             except ValueError:
@@ -232,25 +373,25 @@ def decrypt():
             decrypted = hybrid_decrypt(encrypted_bytes, key_bytes, chaos_key)
 
         else:
-            logging.error(f"Invalid decryption algorithm requested: {algorithm}")
+            logging.error("Invalid decryption algorithm requested: %s", algorithm)
             return jsonify({'error': 'Invalid algorithm'}), 400
 
         # ─── Save decrypted blob ─────────────────────────────────────────────
-        timestamp          = datetime.now().strftime("%Y%m%d%H%M%S")
-        decrypted_filename = f"decrypted_{timestamp}.png"
+        decrypted_filename = blob_filename('decrypted')
         decrypted_path     = os.path.join(DECRYPTED_FOLDER, decrypted_filename)
-        with open(decrypted_path, 'wb') as f:
-            f.write(decrypted)
-        logging.info(f"Decrypted file saved: {decrypted_path}")
+        save_blob_async(decrypted_path, decrypted)
+        logging.info("Decrypted file queued for saving: %s", decrypted_path)
 
-        decrypted_b64 = b64encode(decrypted).decode('utf-8')
-        logging.info(f"Decryption successful for algorithm: {algorithm}")
+        logging.info("Decryption successful for algorithm: %s", algorithm)
 
-        return jsonify({
-            'decrypted_image':     decrypted_b64,
+        response = {
             'decrypted_file_url':  f"/download/decrypted/{decrypted_filename}",
             'decrypted_filename':  decrypted_filename
-        })
+        }
+        # Inline base64 copy only on request; clients normally fetch the file URL
+        if inline:
+            response['decrypted_image'] = b64encode(decrypted).decode('utf-8')
+        return jsonify(response)
 
     except Exception as e:
         logging.exception("Unexpected decryption error")
@@ -259,13 +400,17 @@ def decrypt():
 # ─── Download Routes ────────────────────────────────────────────────────────────
 @app.route('/download/encrypted/<filename>', methods=['GET'])
 def download_encrypted(filename):
+    wait_for_file(ENCRYPTED_FOLDER, filename)
     return send_from_directory(ENCRYPTED_FOLDER, filename, as_attachment=True)
 
 @app.route('/download/decrypted/<filename>', methods=['GET'])
 def download_decrypted(filename):
+    wait_for_file(DECRYPTED_FOLDER, filename)
     return send_from_directory(DECRYPTED_FOLDER, filename, as_attachment=True)
 
 # ─── Main ───────────────────────────────────────────────────────────────────────
 if __name__ == '__main__':
     logging.info("Starting Flask encryption API server on port 5050...")
-    app.run(port=5050, debug=True)
+    # Debugger/reloader only when explicitly requested (FLASK_DEBUG=1)
+    debug = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+    app.run(port=5050, debug=debug)
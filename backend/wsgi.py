@@ -0,0 +1,16 @@
+"""
+WSGI entry point for running the API under a production server, e.g.:
+
+    WEB_CONCURRENCY=$(nproc) gunicorn --threads 4 --bind 127.0.0.1:5050 wsgi:app
+
+gunicorn takes its worker count from WEB_CONCURRENCY, and app.py sizes each
+worker's KDF thread pool from the same variable, so the whole deployment runs
+roughly one KDF at a time per core.
+
+Cipher work and PBKDF2 release the GIL (OpenSSL/PyCryptodome, hashlib, and the
+nogil keystream kernel), so threads overlap concurrent requests within each
+worker.
+"""
+from app import app
+
+__all__ = ['app']